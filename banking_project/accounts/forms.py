@@ -1,4 +1,6 @@
 from django import forms
+
+from clients.models import Client
 from .models import Account
 
 
@@ -18,4 +20,17 @@ class AccountForm(forms.ModelForm):
         balance = self.cleaned_data.get('balance')
         if balance and balance < 0:
             raise forms.ValidationError("Баланс не может быть отрицательным")
-        return balance
\ No newline at end of file
+        return balance
+
+
+class EmployeeAccountForm(AccountForm):
+    """Форма счета для сотрудников и администраторов с выбором клиента"""
+    client = forms.ModelChoiceField(
+        # Для подписи варианта (Client.__str__) нужны только имя и ИНН
+        queryset=Client.objects.only('id', 'full_name', 'inn'),
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Клиент'
+    )
+
+    class Meta(AccountForm.Meta):
+        fields = ['client'] + AccountForm.Meta.fields
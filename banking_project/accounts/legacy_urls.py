@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+# Старые URL для обратной совместимости (можно удалить после миграции).
+# Подключаются одним include из accounts/urls.py, чтобы не удлинять основной список маршрутов.
+# Функциональные копии представлений удалены: старые имена обслуживают те же классовые представления
+urlpatterns = [
+    path('', views.AccountListView.as_view(), name='account_list_old'),
+    path('create/', views.AccountCreateView.as_view(), name='account_create_old'),
+    path('<int:pk>/', views.AccountDetailView.as_view(), name='account_detail_old'),
+    path('<int:pk>/update/', views.AccountUpdateView.as_view(), name='account_update_old'),
+]
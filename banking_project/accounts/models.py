@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, IntegrityError
+from django.db import transaction as db_transaction
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
 from decimal import Decimal
-import random
-import string
+import secrets
 
 
 class Currency(models.Model):
@@ -40,9 +41,37 @@ class Currency(models.Model):
         verbose_name_plural = 'Валюты'
         ordering = ['code']
 
+    CACHE_KEY = 'accounts:currencies'
+    # Строки страницы справочника валют (accounts.views.currency_list)
+    LIST_CACHE_KEY = 'accounts:currency_list'
+    CACHE_TIMEOUT = 3600
+
     def __str__(self):
         return f"{self.code} - {self.name}"
 
+    @classmethod
+    def get_cached_map(cls):
+        """Словарь {pk: Currency} всех валют из кэша"""
+        return cache.get_or_set(
+            cls.CACHE_KEY,
+            lambda: {currency.pk: currency for currency in cls.objects.all()},
+            cls.CACHE_TIMEOUT
+        )
+
+    @classmethod
+    def get_cached(cls, pk):
+        """Получение валюты по pk из кэша без запроса к БД"""
+        currency = cls.get_cached_map().get(pk)
+        if currency is None:
+            # Валюта добавлена после заполнения кэша
+            currency = cls.objects.get(pk=pk)
+        return currency
+
+    @classmethod
+    def clear_cache(cls):
+        """Сброс кэша валют"""
+        cache.delete_many([cls.CACHE_KEY, cls.LIST_CACHE_KEY])
+
 
 class Account(models.Model):
     ACCOUNT_TYPES = (
@@ -92,6 +121,7 @@ class Account(models.Model):
         max_digits=15,
         decimal_places=2,
         default=0.00,
+        editable=False,
         verbose_name='Доступный баланс'
     )
     status = models.CharField(
@@ -153,19 +183,82 @@ class Account(models.Model):
         verbose_name = 'Банковский счет'
         verbose_name_plural = 'Банковские счета'
         ordering = ['-opening_date']
+        # Отдельный индекс по account_number не нужен: его обслуживает уникальный индекс поля
         indexes = [
-            models.Index(fields=['account_number']),
-            models.Index(fields=['client', 'status']),
+            # Покрывает выборку счетов клиента по статусу вместе с сортировкой по дате открытия
+            models.Index(fields=['client', 'status', '-opening_date']),
             models.Index(fields=['account_type', 'status']),
-            models.Index(fields=['opening_date']),
+            # Keyset-пагинация списка счетов по (opening_date, id): для сотрудников - все счета,
+            # для клиента - его счета (AccountListView.get_queryset)
+            models.Index(fields=['-opening_date', '-id']),
+            models.Index(fields=['client', '-opening_date', '-id']),
         ]
 
     def __str__(self):
         return f"{self.account_number} - {self.client.full_name} ({self.balance} {self.currency.code})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные значения, чтобы save() обновлял только измененные поля
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, *args, **kwargs):
+        # Остальные аргументы (from_queryset в Django 5.x) передаются без изменений
+        super().refresh_from_db(using, fields, *args, **kwargs)
+        # Перечитанные (в том числе отложенные) поля считаются неизмененными
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None:
+            for field in self._meta.concrete_fields:
+                if fields is None or field.attname in fields or field.name in fields:
+                    if field.attname in self.__dict__:
+                        loaded[field.attname] = getattr(self, field.attname)
+
+    def get_changed_fields(self):
+        """Поля, измененные с момента загрузки из БД (None для еще не загруженного счета)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {
+            field.attname
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname))
+        }
+
+    # Версия кэша списка счетов (страницы и статистика в accounts.views):
+    # смена версии делает недействительными все закэшированные ключи сразу.
+    # Меняется при save()/delete() (accounts.signals) и после изменений балансов через UPDATE
+    LIST_CACHE_VERSION_KEY = 'accounts:list_version'
+
+    @classmethod
+    def get_list_cache_version(cls):
+        """Текущая версия кэша списка счетов"""
+        return cache.get_or_set(cls.LIST_CACHE_VERSION_KEY, 1, None)
+
+    @classmethod
+    def invalidate_list_cache(cls):
+        """Сброс кэша списка счетов сменой версии"""
+        try:
+            cache.incr(cls.LIST_CACHE_VERSION_KEY)
+        except ValueError:
+            # Ключа версии еще нет - кэш списка пуст
+            pass
+
+    @classmethod
+    def invalidate_list_cache_on_commit(cls):
+        """
+        Сброс кэша списка после фиксации транзакции: для изменений через UPDATE,
+        которые не вызывают сигналов. До коммита параллельный запрос закэшировал бы старые данные
+        """
+        db_transaction.on_commit(cls.invalidate_list_cache)
+
     def save(self, *args, **kwargs):
-        if not self.account_number:
-            self.account_number = self.generate_account_number()
+        generated_number = not self.account_number
+        if generated_number:
+            # Номер без предварительной проверки в БД: конфликт (1 из 10^12) ловит уникальный индекс
+            self.account_number = self.random_account_number()
 
         # Автоматический расчет доступного баланса
         self.available_balance = self.balance + self.overdraft_limit
@@ -173,70 +266,227 @@ class Account(models.Model):
         # Если счет закрывается, устанавливаем дату закрытия
         if self.status == 'closed' and not self.closing_date:
             from django.utils import timezone
-            self.closing_date = timezone.now().date()
+            self.closing_date = timezone.localdate()
+
+        # Для загруженного счета пишем только измененные колонки вместо всей строки
+        changed_fields = self.get_changed_fields()
+        if (changed_fields is not None and not args
+                and kwargs.get('update_fields') is None and not kwargs.get('force_insert')):
+            # Поля с auto_now обновляются при каждом сохранении
+            kwargs['update_fields'] = changed_fields | {'last_activity_date', 'updated_at'}
+
+        if not generated_number:
+            super().save(*args, **kwargs)
+        else:
+            try:
+                with db_transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError:
+                # Номер уже занят - берем гарантированно свободный с проверкой в БД
+                self.account_number = self.generate_account_number()
+                if 'update_fields' in kwargs:
+                    kwargs['update_fields'] = kwargs['update_fields'] | {'account_number'}
+                super().save(*args, **kwargs)
+
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
 
-        super().save(*args, **kwargs)
+    @staticmethod
+    def random_account_number():
+        """Случайный номер счета без обращения к БД"""
+        # Формат: 40702810XXXXXXXXXXXX (20 цифр)
+        # 407 - счет, 02 - рубль, 810 - код рубля, остальные - случайные
+        return f"40702810{secrets.randbelow(10 ** 12):012d}"
 
-    def generate_account_number(self):
+    def generate_account_number(self, batch_size=16):
         """Генерация уникального номера счета"""
         while True:
-            # Формат: 40702810XXXXXXXXXXXXX (20 цифр)
-            # 407 - счет, 02 - рубль, 810 - код рубля, остальные - случайные
-            base = "40702810"
-            random_part = ''.join(random.choices(string.digits, k=12))
-            account_number = base + random_part
-
-            if not Account.objects.filter(account_number=account_number).exists():
-                return account_number
+            # Проверяем сразу пачку кандидатов одним запросом вместо запроса на каждую попытку
+            candidates = {self.random_account_number() for _ in range(batch_size)}
+            taken = set(
+                Account.objects.filter(account_number__in=candidates)
+                .values_list('account_number', flat=True)
+            )
+            free = candidates - taken
+            if free:
+                return free.pop()
 
     def can_withdraw(self, amount):
         """Можно ли снять указанную сумму"""
-        return self.available_balance >= amount and self.status == 'active'
+        # Сначала дешевое сравнение строк: для неактивного счета Decimal не сравниваем
+        return self.status == 'active' and self.available_balance >= amount
+
+    def withdraw(self, amount, refresh=True):
+        """
+        Снятие средств со счета.
+        refresh=False - не перечитывать балансы после UPDATE (экземпляр дальше не используется)
+        """
+        # Проверка и списание выполняются одним UPDATE, без гонки чтение-изменение-запись
+        updated = Account.objects.filter(
+            pk=self.pk, status='active', available_balance__gte=amount
+        ).update(**self._balance_change_expressions(-amount))
+        if updated:
+            Account.invalidate_list_cache_on_commit()
+            if refresh:
+                self._refresh_balances()
+        return updated == 1
+
+    def credit(self, amount, refresh=True):
+        """
+        Зачисление средств на счет одним UPDATE.
+        Имя deposit занято обратной связью deposits.Deposit (related_name='deposit').
+        refresh - как в withdraw
+        """
+        updated = Account.objects.filter(
+            pk=self.pk, status='active'
+        ).update(**self._balance_change_expressions(amount))
+        if updated:
+            Account.invalidate_list_cache_on_commit()
+            if refresh:
+                self._refresh_balances()
+        return updated == 1
+
+    @staticmethod
+    def _balance_change_expressions(delta):
+        """Выражения UPDATE для изменения баланса на стороне БД"""
+        from django.utils import timezone
 
-    def withdraw(self, amount):
-        """Снятие средств со счета"""
-        if self.can_withdraw(amount):
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        now = timezone.now()
+        return {
+            'balance': models.F('balance') + delta,
+            'available_balance': models.F('available_balance') + delta,
+            'last_activity_date': timezone.localdate(now),
+            'updated_at': now,
+        }
 
-    def deposit(self, amount):
-        """Пополнение счета"""
-        if self.status == 'active':
-            self.balance += amount
-            self.save()
-            return True
-        return False
+    def _refresh_balances(self):
+        """Перечитывание балансов после UPDATE на стороне БД"""
+        self.refresh_from_db(fields=['balance', 'available_balance', 'last_activity_date', 'updated_at'])
 
     def transfer(self, to_account, amount):
         """Перевод на другой счет"""
-        if self.can_withdraw(amount):
+        # Перевод на тот же счет: bulk_update записал бы одну строку дважды и списание бы потерялось
+        if self.pk == to_account.pk:
+            return False
+        with db_transaction.atomic():
+            # Блокируем оба счета в порядке pk (без взаимных блокировок встречных переводов)
+            # и перечитываем актуальные балансы
+            locked = Account.objects.select_for_update().order_by('pk').in_bulk([self.pk, to_account.pk])
+            for account in (self, to_account):
+                current = locked[account.pk]
+                account.balance = current.balance
+                account.available_balance = current.available_balance
+                account.status = current.status
+
+            if not self.can_withdraw(amount):
+                return False
+
             self.balance -= amount
             to_account.balance += amount
-            self.save()
-            to_account.save()
+            Account._bulk_save_balances([self, to_account])
             return True
-        return False
 
-    def get_transaction_history(self, days=30):
-        """История транзакций за указанный период"""
+    @classmethod
+    def recalculate_available_balance(cls, queryset=None):
+        """
+        Пересчет доступного баланса на стороне БД одним UPDATE.
+        Нужен после массовых изменений через QuerySet.update(), минующих save()
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        updated = queryset.update(available_balance=models.F('balance') + models.F('overdraft_limit'))
+        if updated:
+            cls.invalidate_list_cache_on_commit()
+        return updated
+
+    @classmethod
+    def accrue_interest(cls, periods_per_year=12):
+        """
+        Начисление процентов по активным счетам за один период (по умолчанию месяц).
+        Выполняется одним UPDATE на каждую пару (тип счета, валюта), а не сохранением каждого счета
+        """
+        from django.utils import timezone
+
+        now = timezone.now()
+        today = timezone.localdate(now)
+        rates = AccountInterestRate.objects.filter(
+            is_active=True,
+            effective_date__lte=today
+        ).order_by('account_type', 'currency_id', '-effective_date')
+
+        updated = 0
+        processed_buckets = set()
+        with db_transaction.atomic():
+            for rate in rates:
+                bucket = (rate.account_type, rate.currency_id)
+                # Действует последняя вступившая в силу ставка
+                if bucket in processed_buckets:
+                    continue
+                processed_buckets.add(bucket)
+
+                factor = Decimal('1') + rate.interest_rate / Decimal('100') / periods_per_year
+                updated += cls.objects.filter(
+                    account_type=rate.account_type,
+                    currency_id=rate.currency_id,
+                    status='active',
+                    balance__gte=rate.min_balance
+                ).update(
+                    balance=models.F('balance') * factor,
+                    available_balance=models.F('balance') * factor + models.F('overdraft_limit'),
+                    last_activity_date=today,
+                    updated_at=now
+                )
+            if updated:
+                cls.invalidate_list_cache_on_commit()
+        return updated
+
+    @classmethod
+    def _bulk_save_balances(cls, accounts):
+        """Сохранение балансов без полного save() для каждого счета"""
+        from django.utils import timezone
+
+        now = timezone.now()
+        today = timezone.localdate(now)
+        for account in accounts:
+            account.available_balance = account.balance + account.overdraft_limit
+            account.last_activity_date = today
+            account.updated_at = now
+
+        cls.objects.bulk_update(
+            accounts,
+            fields=['balance', 'available_balance', 'last_activity_date', 'updated_at']
+        )
+        cls.invalidate_list_cache_on_commit()
+
+    def get_transaction_history(self, days=30, limit=100, before=None):
+        """
+        История транзакций за указанный период.
+        Возвращает не более limit последних транзакций каждого направления;
+        для следующей страницы передается before - created_at последней полученной транзакции
+        """
         from django.utils import timezone
         from datetime import timedelta
 
         start_date = timezone.now() - timedelta(days=days)
 
-        # Используем related_name, определенные в модели Transaction
+        # Используем related_name, определенные в модели Transaction.
+        # Выборка идет по индексам (from_account, created_at) и (to_account, created_at)
         sent_transactions = self.sent_transactions.filter(
             created_at__gte=start_date
         )
         received_transactions = self.received_transactions.filter(
             created_at__gte=start_date
         )
+        if before is not None:
+            sent_transactions = sent_transactions.filter(created_at__lt=before)
+            received_transactions = received_transactions.filter(created_at__lt=before)
 
         return {
-            'sent': sent_transactions,
-            'received': received_transactions
+            'sent': sent_transactions.order_by('-created_at')[:limit],
+            'received': received_transactions.order_by('-created_at')[:limit]
         }
 
 
@@ -293,6 +543,49 @@ class AccountBalanceHistory(models.Model):
     def __str__(self):
         return f"{self.account.account_number} - {self.date}"
 
+    @classmethod
+    def snapshot(cls, accounts=None, date=None, batch_size=5000):
+        """
+        Снимок балансов счетов на дату пакетной вставкой, возвращает число обработанных счетов.
+        Начальный баланс берется из последней предыдущей записи истории.
+        Повторный запуск за ту же дату безопасен: дубликаты отсекаются уникальностью (account, date)
+        """
+        from django.utils import timezone
+
+        if date is None:
+            date = timezone.localdate()
+        if accounts is None:
+            accounts = Account.objects.all()
+
+        previous_closing = cls.objects.filter(
+            account=models.OuterRef('pk'),
+            date__lt=date
+        ).order_by('-date').values('closing_balance')[:1]
+
+        rows = accounts.annotate(
+            previous_closing=models.Subquery(previous_closing)
+        ).values_list('pk', 'balance', 'previous_closing')
+
+        # Вставляем пачками по мере чтения, чтобы не держать в памяти все счета
+        # bulk_create с ignore_conflicts не сообщает, какие строки вставлены: считаем обработанные счета
+        processed = 0
+        batch = []
+        for account_id, balance, opening in rows.iterator(chunk_size=batch_size):
+            batch.append(cls(
+                account_id=account_id,
+                date=date,
+                opening_balance=opening if opening is not None else balance,
+                closing_balance=balance,
+            ))
+            if len(batch) >= batch_size:
+                cls.objects.bulk_create(batch, ignore_conflicts=True)
+                processed += len(batch)
+                batch = []
+        if batch:
+            cls.objects.bulk_create(batch, ignore_conflicts=True)
+            processed += len(batch)
+        return processed
+
 
 class AccountInterestRate(models.Model):
     """Процентные ставки по типам счетов"""
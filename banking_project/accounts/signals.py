@@ -0,0 +1,27 @@
+"""
+Сигналы приложения счетов
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Account, Currency
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def clear_currency_cache(sender, **kwargs):
+    """
+    Сбрасывает кэш валют при любом изменении справочника
+    """
+    Currency.clear_cache()
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def clear_account_list_cache(sender, **kwargs):
+    """
+    Сбрасывает кэш списка счетов при сохранении или удалении счета.
+    Изменения через UPDATE сигналов не вызывают - кэш после них сбрасывают
+    методы Account (Account.invalidate_list_cache_on_commit)
+    """
+    Account.invalidate_list_cache()
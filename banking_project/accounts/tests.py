@@ -1,3 +1,41 @@
+from decimal import Decimal
+
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+
+from users.models import User
+from .models import Account, Currency
+
+
+class AccountTransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='client', email='client@example.com', password='password', role='client'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽')
+        self.account = Account.objects.create(
+            client=self.user.client_profile,
+            account_type='checking',
+            currency=self.currency,
+            balance=Decimal('70.00'),
+            overdraft_limit=Decimal('0.00')
+        )
+
+    def test_transfer_to_same_account_is_rejected(self):
+        self.assertFalse(self.account.transfer(self.account, Decimal('10.00')))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('70.00'))
 
-# Create your tests here.
+    def test_transfer_view_rejects_same_account(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('accounts:account_transfer'), {
+            'from_account': self.account.pk,
+            'to_account': self.account.pk,
+            'amount': '10.00',
+        })
+        self.assertRedirects(response, reverse('accounts:account_transfer'), fetch_redirect_response=False)
+        self.assertIn('Нельзя переводить средства на тот же счет',
+                      [str(message) for message in get_messages(response.wsgi_request)])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('70.00'))
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, include
 from . import views
 
 app_name = 'accounts'
@@ -18,10 +18,8 @@ urlpatterns = [
     path('<int:pk>/withdraw/', views.account_withdraw, name='account_withdraw'),
     path('transfer/', views.account_transfer, name='account_transfer'),
     path('currencies/', views.currency_list, name='currency_list'),
+    path('export/csv/', views.export_accounts_csv, name='account_export_csv'),
 
-    # Старые URL для обратной совместимости (можно удалить после миграции)
-    path('old/', views.account_list_old, name='account_list_old'),
-    path('old/create/', views.account_create_old, name='account_create_old'),
-    path('old/<int:pk>/', views.account_detail_old, name='account_detail_old'),
-    path('old/<int:pk>/update/', views.account_update_old, name='account_update_old'),
+    # Старые URL для обратной совместимости
+    path('old/', include('accounts.legacy_urls')),
 ]
\ No newline at end of file
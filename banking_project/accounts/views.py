@@ -1,21 +1,42 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.apps import apps
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db import models
-from django.http import HttpResponse, JsonResponse, HttpResponseForbidden
-from django.db.models import Sum, Avg, Count
-from django.core.paginator import Paginator
-from decimal import Decimal
+from django.db import DatabaseError, IntegrityError, transaction as db_transaction
+from django.http import JsonResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
+from django.db.models import Sum, Avg, Count, Value, Case, When
+from django.db.models.functions import Cast, Coalesce, Concat, TruncDate, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.cache import cache
+from decimal import Decimal, InvalidOperation
+import codecs
 import csv
-import json
-from datetime import datetime, timedelta
+import io
+from datetime import date
 import random
 import string
-from django import forms
+
+from clients.utils import get_request_client
+from clients.models import Client
+from transactions.models import Transaction
+from users.decorators import get_user_role
+from .forms import AccountForm, EmployeeAccountForm
+from .models import Account, Currency
+
+# Общий ленивый URL списка счетов для success_url представлений
+ACCOUNT_LIST_URL = reverse_lazy('accounts:account_list')
+
+# Страницы и статистика списка счетов для сотрудников кэшируются на короткое время.
+# Кэш сбрасывается сразу при save()/delete() счета (accounts.signals)
+# и после изменений через UPDATE: зачисления, списания, переводы, закрытие счета, проценты
+ACCOUNT_LIST_CACHE_TIMEOUT = 30
+
+# Множества ролей строятся один раз: проверка членства O(1)
+ACCOUNT_CREATOR_ROLES = frozenset({'client', 'employee', 'admin'})
 
 # Импорт миксинов
 try:
@@ -36,7 +57,8 @@ except ImportError:
 
     class EmployeeOrAdminRequiredMixin(UserPassesTestMixin):
         def test_func(self):
-            return self.request.user.is_authenticated and self.request.user.role in ['employee', 'admin']
+            user = self.request.user
+            return user.is_authenticated and user.is_staff_role
 
         def handle_no_permission(self):
             return Http403("Только сотрудники и администраторы имеют доступ к этой странице")
@@ -44,41 +66,99 @@ except ImportError:
 
     class AdminRequiredMixin(UserPassesTestMixin):
         def test_func(self):
-            return self.request.user.is_authenticated and self.request.user.role == 'admin'
+            user = self.request.user
+            return user.is_authenticated and getattr(user, 'role', None) == 'admin'
 
         def handle_no_permission(self):
             return Http403("Только администраторы имеют доступ к этой странице")
 
 
-def get_user_model():
-    """Ленивая загрузка модели User"""
-    return apps.get_model('users', 'User')
+# Поля, которые выводит шаблон accounts/account_list.html; остальные колонки не загружаем.
+# opening_date нужна для курсора keyset-пагинации
+ACCOUNT_LIST_FIELDS = (
+    'id', 'account_number', 'account_type', 'balance', 'status', 'interest_rate', 'currency_id',
+    'opening_date',
+    'client__id', 'client__full_name', 'client__user',
+)
+
+# Поля операции, которые выводят таблицы операций счета. Шаблоны не обращаются к счетам
+# и валюте операции (сумма выводится в валюте счета), поэтому JOIN'ы не нужны
+TRANSACTION_ROW_FIELDS = (
+    'id', 'created_at', 'transaction_type', 'description', 'amount', 'status',
+)
 
+# Размер страницы истории операций счета
+TRANSACTIONS_PAGE_SIZE = 20
 
-def get_client_model():
-    """Ленивая загрузка модели Client"""
-    return apps.get_model('clients', 'Client')
+# Размер порции потоковой выгрузки CSV (символов)
+CSV_EXPORT_CHUNK_SIZE = 64 * 1024
 
+# Попыток создать профиль клиента со случайными ИНН/СНИЛС при конфликте уникальности
+CLIENT_CREATE_ATTEMPTS = 5
+
+
+def attach_cached_currencies(accounts):
+    """
+    Подставляет валюты счетам из кэша вместо JOIN с таблицей валют
+    """
+    for account in accounts:
+        account.currency = Currency.get_cached(account.currency_id)
+    return accounts
 
-def get_account_model():
-    """Ленивая загрузка модели Account"""
-    return apps.get_model('accounts', 'Account')
 
+def get_user_accounts(request):
+    """
+    Счета, доступные пользователю: клиенту - только свои, сотрудникам и администраторам - все.
+    Фильтр по client__user не требует отдельного запроса за профилем клиента
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return Account.objects.none()
+    if user.is_staff_role:
+        return Account.objects.all()
+    if user.role == 'client':
+        return Account.objects.filter(client__user=user)
+    return Account.objects.none()
 
-def get_currency_model():
-    """Ленивая загрузка модели Currency"""
-    return apps.get_model('accounts', 'Currency')
 
+def add_currency_names(rows, with_name=True):
+    """
+    Дополняет строки values('currency_id') кодом (и названием) валюты из кэша
+    справочника - группировка по счетам обходится без JOIN с таблицей валют
+    """
+    currencies = Currency.get_cached_map()
+    rows = list(rows)
+    for row in rows:
+        currency = currencies.get(row['currency_id'])
+        row['currency__code'] = currency.code if currency else ''
+        if with_name:
+            row['currency__name'] = currency.name if currency else ''
+    return rows
 
-def get_account_form():
-    """Ленивая загрузка формы Account"""
-    from .forms import AccountForm
-    return AccountForm
 
+def get_account_transactions(account, *args, **kwargs):
+    """
+    Операции по счету с условиями фильтрации (args/kwargs - как у filter).
+    Вместо OR по from_account/to_account - UNION ALL двух выборок, каждая идет
+    по своему индексу (from_account|to_account, -created_at, -id). Перевод на тот же
+    счет исключается из второй выборки, чтобы не попасть в результат дважды
+    """
+    # Сортировка модели по умолчанию в частях UNION недопустима - порядок задается у результата
+    base = Transaction.objects.only(*TRANSACTION_ROW_FIELDS).filter(*args, **kwargs).order_by()
+    sent = base.filter(from_account=account)
+    received = base.filter(to_account=account).exclude(from_account=account)
+    return sent.union(received, all=True)
 
-def get_transaction_model():
-    """Ленивая загрузка модели Transaction"""
-    return apps.get_model('transactions', 'Transaction')
+
+def get_account_for_user(request, pk):
+    """
+    Счет, доступный пользователю, или 404.
+    Права проверяются в том же запросе, что и выборка счета
+    """
+    account = get_object_or_404(get_user_accounts(request).select_related('client__user'), pk=pk)
+    # Валюта берется из кэша справочника, без JOIN
+    attach_cached_currencies([account])
+    return account
 
 
 def create_client_for_user(user):
@@ -86,50 +166,49 @@ def create_client_for_user(user):
     Функция для создания профиля клиента для пользователя
     Используется, если сигналы не сработали
     """
-    Client = get_client_model()
-
     # Проверяем, есть ли уже профиль
     if hasattr(user, 'client_profile'):
         return user.client_profile
 
-    # Генерируем уникальные данные
-    from django.utils import timezone
-    from datetime import date
-
-    # Генерируем уникальные ИНН и СНИЛС
-    while True:
+    # Уникальность ИНН и СНИЛС проверяет уникальный индекс БД: вставляем сразу
+    # и генерируем новые значения только при конфликте
+    now = timezone.now()
+    for attempt in range(CLIENT_CREATE_ATTEMPTS):
         inn = ''.join(random.choices(string.digits, k=12))
-        if not Client.objects.filter(inn=inn).exists():
-            break
-
-    while True:
         snils = f"{''.join(random.choices(string.digits, k=3))}-" \
                 f"{''.join(random.choices(string.digits, k=3))}-" \
                 f"{''.join(random.choices(string.digits, k=3))} 00"
-        if not Client.objects.filter(snils=snils).exists():
+        try:
+            with db_transaction.atomic():
+                # Создаем профиль клиента
+                client = Client.objects.create(
+                    user=user,
+                    full_name=f"{user.first_name or ''} {user.last_name or ''}".strip() or "Не указано",
+                    passport_series='0000',
+                    passport_number='000000',
+                    passport_issued_by='АВТОМАТИЧЕСКИ СОЗДАНО СИСТЕМОЙ',
+                    passport_issue_date=date(2000, 1, 1),
+                    passport_department_code='000-000',
+                    registration_address='НЕ УКАЗАНО',
+                    inn=inn,
+                    snils=snils,
+                    marital_status='single',
+                    education_level='secondary',
+                    work_experience=0,
+                    monthly_income=0,
+                    credit_rating=500,
+                    is_vip=False,
+                    created_at=now,
+                    updated_at=now
+                )
             break
-
-    # Создаем профиль клиента
-    client = Client.objects.create(
-        user=user,
-        full_name=f"{user.first_name or ''} {user.last_name or ''}".strip() or "Не указано",
-        passport_series='0000',
-        passport_number='000000',
-        passport_issued_by='АВТОМАТИЧЕСКИ СОЗДАНО СИСТЕМОЙ',
-        passport_issue_date=date(2000, 1, 1),
-        passport_department_code='000-000',
-        registration_address='НЕ УКАЗАНО',
-        inn=inn,
-        snils=snils,
-        marital_status='single',
-        education_level='secondary',
-        work_experience=0,
-        monthly_income=0,
-        credit_rating=500,
-        is_vip=False,
-        created_at=timezone.now(),
-        updated_at=timezone.now()
-    )
+        except IntegrityError:
+            # Профиль мог создать параллельный запрос (сигнал) - тогда возвращаем его
+            existing = Client.objects.filter(user=user).first()
+            if existing is not None:
+                return existing
+            if attempt == CLIENT_CREATE_ATTEMPTS - 1:
+                raise
 
     return client
 
@@ -138,11 +217,12 @@ def create_client_for_user(user):
 def role_required(allowed_roles):
     from functools import wraps
 
+    allowed_roles = frozenset(allowed_roles)
+
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            User = get_user_model()
-            if request.user.is_authenticated and request.user.role in allowed_roles:
+            if get_user_role(request) in allowed_roles:
                 return view_func(request, *args, **kwargs)
             else:
                 return HttpResponseForbidden("У вас нет доступа к этой странице.")
@@ -153,7 +233,15 @@ def role_required(allowed_roles):
 
 
 def employee_required(view_func):
-    return role_required(['employee', 'admin'])(view_func)
+    from functools import wraps
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated and request.user.is_staff_role:
+            return view_func(request, *args, **kwargs)
+        return HttpResponseForbidden("У вас нет доступа к этой странице.")
+
+    return wrapper
 
 
 def admin_required(view_func):
@@ -168,58 +256,90 @@ class AccountListView(LoginRequiredMixin, ListView):
     context_object_name = 'accounts'
     paginate_by = 20
 
+    def get_user_accounts(self):
+        """Базовый queryset счетов пользователя, общий для списка и статистики"""
+        if not hasattr(self, '_user_accounts'):
+            self._user_accounts = get_user_accounts(self.request)
+        return self._user_accounts
+
     def get_queryset(self):
-        Account = get_account_model()
+        # Клиент видит только свои счета, сотрудники и администраторы - все
+        accounts = self.get_user_accounts()
 
-        # Если клиент - показываем только его счета
-        if self.request.user.role == 'client':
+        # Добавляем связанные данные для оптимизации запросов
+        # Валюты подставляются из кэша в get_context_data
+        # Пользователь клиента не присоединяется: шаблону достаточно client.user_id
+        accounts = accounts.select_related('client').only(*ACCOUNT_LIST_FIELDS)
+        # Сортировка по индексированной дате открытия; id делает порядок страниц стабильным
+        return accounts.order_by('-opening_date', '-id')
+
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset-пагинация по (opening_date, id): ?after=<дата>,<id> вместо OFFSET"""
+        cursor = self.request.GET.get('after')
+        if cursor:
             try:
-                Client = get_client_model()
-                client = Client.objects.get(user=self.request.user)
-                accounts = client.accounts.all()
-            except Client.DoesNotExist:
-                # Если клиента нет, создаем его
-                client = create_client_for_user(self.request.user)
-                accounts = client.accounts.all()
-            except Exception as e:
-                accounts = Account.objects.none()
-        # Если сотрудник или администратор - показываем все счета
-        elif self.request.user.role in ['employee', 'admin']:
-            accounts = Account.objects.all()
+                date_str, pk_str = cursor.split(',')
+                after_date = date.fromisoformat(date_str)
+                after_pk = int(pk_str)
+            except ValueError:
+                raise Http404('Некорректный курсор страницы')
+            queryset = queryset.filter(
+                models.Q(opening_date__lt=after_date) |
+                models.Q(opening_date=after_date, id__lt=after_pk)
+            )
+            cursor = f'{after_date.isoformat()},{after_pk}'
+
+        # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+        def fetch_rows():
+            return list(queryset[:page_size + 1])
+
+        # Сотрудники видят одни и те же страницы всех счетов - кэшируем их на короткое время
+        if self.request.user.is_staff_role:
+            rows = cache.get_or_set(
+                self.get_staff_cache_key('page', cursor or ''), fetch_rows, ACCOUNT_LIST_CACHE_TIMEOUT
+            )
         else:
-            accounts = Account.objects.none()
-
-        # Добавляем связанные данные для оптимизации запросов
-        accounts = accounts.select_related('client', 'client__user', 'currency')
-        return accounts.order_by('-created_at')
+            rows = fetch_rows()
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        self.next_cursor = None
+        if has_next:
+            last = rows[-1]
+            self.next_cursor = f'{last.opening_date.isoformat()},{last.pk}'
+        return None, None, rows, has_next
+
+    def get_staff_cache_key(self, *parts):
+        """Ключ кэша списка сотрудников с текущей версией (см. Account.invalidate_list_cache)"""
+        return ':'.join(['accounts:list', str(Account.get_list_cache_version()), *parts])
+
+    def get_account_stats(self):
+        """Сумма и счетчики по статусам - одним запросом с условной агрегацией"""
+        stats = self.get_user_accounts().aggregate(
+            total_balance=Sum('balance'),
+            active_accounts=Count('id', filter=models.Q(status='active')),
+            blocked_accounts=Count('id', filter=models.Q(status='blocked')),
+            closed_accounts=Count('id', filter=models.Q(status='closed')),
+        )
+        stats['total_balance'] = stats['total_balance'] or Decimal('0.00')
+        return stats
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['user_role'] = self.request.user.role
-
-        # Статистика по счетам
-        Account = get_account_model()
-        if self.request.user.role == 'client':
-            try:
-                Client = get_client_model()
-                client = Client.objects.get(user=self.request.user)
-                accounts = client.accounts.all()
-            except:
-                accounts = Account.objects.none()
+        context['user_role'] = get_user_role(self.request)
+        context['next_cursor'] = self.next_cursor
+        context['is_first_page'] = 'after' not in self.request.GET
+        attach_cached_currencies(context['object_list'])
+
+        # Статистика по всем счетам банка (сотрудники) - полный проход по таблице,
+        # поэтому она кэшируется на короткое время; у клиента счетов мало, считаем сразу
+        if self.request.user.is_staff_role:
+            stats = cache.get_or_set(
+                self.get_staff_cache_key('stats'), self.get_account_stats, ACCOUNT_LIST_CACHE_TIMEOUT
+            )
         else:
-            accounts = Account.objects.all()
-
-        total_balance = accounts.aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
-        active_accounts = accounts.filter(status='active').count()
-        blocked_accounts = accounts.filter(status='blocked').count()
-        closed_accounts = accounts.filter(status='closed').count()
-
-        context.update({
-            'total_balance': total_balance,
-            'active_accounts': active_accounts,
-            'blocked_accounts': blocked_accounts,
-            'closed_accounts': closed_accounts,
-        })
+            stats = self.get_account_stats()
+        context.update(stats)
 
         return context
 
@@ -230,35 +350,23 @@ class AccountDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'account'
 
     def get_queryset(self):
-        Account = get_account_model()
-        return Account.objects.all().select_related('client', 'client__user', 'currency')
+        # Клиенту доступны только свои счета: чужой счет не найдется (404) без отдельной проверки
+        return get_user_accounts(self.request).select_related('client', 'client__user')
 
-    def get(self, request, *args, **kwargs):
-        # Дополнительная проверка прав доступа
-        account = self.get_object()
-        if request.user.role == 'client':
-            try:
-                Client = get_client_model()
-                client = Client.objects.get(user=request.user)
-                if account.client != client:
-                    messages.error(request, 'У вас нет доступа к этому счету')
-                    return redirect('accounts:account_list')
-            except:
-                messages.error(request, 'У вас нет доступа к этому счету')
-                return redirect('accounts:account_list')
-        return super().get(request, *args, **kwargs)
+    def get_object(self, queryset=None):
+        # Валюта берется из кэша справочника, без JOIN
+        return attach_cached_currencies([super().get_object(queryset)])[0]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Получаем последние транзакции по счету
-        Transaction = get_transaction_model()
+        # Получаем последние транзакции по счету. Выборка выполняется здесь, а не при
+        # рендеринге шаблона: ошибка БД попадает в except, а шаблон не делает запросов
         try:
-            transactions = Transaction.objects.filter(
-                models.Q(from_account=self.object) | models.Q(to_account=self.object)
-            ).select_related('from_account', 'to_account', 'currency').order_by('-created_at')[:10]
-            context['transactions'] = transactions
-        except:
-            context['transactions'] = []
+            transactions = list(get_account_transactions(self.object).order_by('-created_at', '-id')[:10])
+            # Шаблон account_detail.html выводит операции из recent_transactions
+            context['recent_transactions'] = transactions
+        except DatabaseError:
+            context['recent_transactions'] = []
 
         return context
 
@@ -266,62 +374,45 @@ class AccountDetailView(LoginRequiredMixin, DetailView):
 class AccountCreateView(LoginRequiredMixin, CreateView):
     """Создание нового счета - классовая версия"""
     template_name = 'accounts/account_form.html'
-    success_url = reverse_lazy('accounts:account_list')
+    success_url = ACCOUNT_LIST_URL
 
     def get_form_class(self):
-        return get_account_form()
+        # Классы форм создаются один раз при импорте; сотрудникам нужна форма с выбором клиента
+        if self.request.user.is_staff_role:
+            return EmployeeAccountForm
+        return AccountForm
 
     def dispatch(self, request, *args, **kwargs):
+        # Этот dispatch выполняется раньше LoginRequiredMixin: анонимного пользователя
+        # сразу отправляем на вход, не доходя до проверки роли
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
         # Разрешаем доступ клиентам, сотрудникам и администраторам
-        if request.user.role not in ['client', 'employee', 'admin']:
+        if get_user_role(request) not in ACCOUNT_CREATOR_ROLES:
             return HttpResponseForbidden("У вас нет доступа к этой странице.")
         return super().dispatch(request, *args, **kwargs)
 
-    def get_form(self, form_class=None):
-        form = super().get_form(form_class)
-        Client = get_client_model()
-
-        if self.request.user.role == 'client':
-            # Для клиентов скрываем поле выбора клиента и устанавливаем текущего клиента
-            try:
-                client = Client.objects.get(user=self.request.user)
-                if 'client' in form.fields:  # Проверяем, существует ли поле
-                    form.fields['client'].initial = client
-                    form.fields['client'].widget = forms.HiddenInput()
-            except Client.DoesNotExist:
-                client = create_client_for_user(self.request.user)
-                if 'client' in form.fields:  # Проверяем, существует ли поле
-                    form.fields['client'].initial = client
-                    form.fields['client'].widget = forms.HiddenInput()
-        elif self.request.user.role in ['employee', 'admin']:
-            # Для сотрудников и администраторов добавляем поле выбора клиента
-            if 'client' in form.fields:  # Проверяем, существует ли поле
-                form.fields['client'].queryset = Client.objects.all()
-                form.fields['client'].widget.attrs.update({'class': 'form-select'})
-
-        return form
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Шаблон строит список выбора клиента из clients
+        client_field = context['form'].fields.get('client')
+        if client_field is not None:
+            context['clients'] = client_field.queryset
+        return context
 
     def form_valid(self, form):
-        Account = get_account_model()
-
-        # Если пользователь - клиент, автоматически привязываем его к счету
-        if self.request.user.role == 'client':
-            try:
-                Client = get_client_model()
-                client = Client.objects.get(user=self.request.user)
-                form.instance.client = client
-            except Client.DoesNotExist:
-                client = create_client_for_user(self.request.user)
-                form.instance.client = client
-
-        # Генерация номера счета, если не указан
-        if not form.instance.account_number:
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            random_part = ''.join(str(i) for i in range(10))
-            form.instance.account_number = f"ACC{timestamp}{random_part[:6]}"
+        # Профиль клиента и счет создаются вместе: при ошибке сохранения счета
+        # не остается профиля без счета. Сообщение пишется уже после коммита
+        with db_transaction.atomic():
+            # Если пользователь - клиент, автоматически привязываем его к счету
+            if get_user_role(self.request) == 'client':
+                form.instance.client = (
+                    get_request_client(self.request) or create_client_for_user(self.request.user)
+                )
 
-        response = super().form_valid(form)
-        messages.success(self.request, f'Счет №{self.object.account_number} успешно создан')
+            # Номер счета генерирует Account.save() (secrets + повтор при конфликте)
+            response = super().form_valid(form)
+        messages.success(self.request, f'Счет №{form.instance.account_number} успешно создан')
         return response
 
     def form_invalid(self, form):
@@ -335,18 +426,18 @@ class AccountUpdateView(LoginRequiredMixin, EmployeeOrAdminRequiredMixin, Update
     context_object_name = 'account'
 
     def get_form_class(self):
-        return get_account_form()
+        return AccountForm
 
     def get_queryset(self):
-        Account = get_account_model()
         return Account.objects.all().select_related('client', 'client__user', 'currency')
 
     def get_success_url(self):
-        return reverse_lazy('accounts:account_detail', kwargs={'pk': self.object.pk})
+        # URL нужен сразу для редиректа: ленивая обертка здесь лишняя
+        return reverse('accounts:account_detail', kwargs={'pk': self.object.pk})
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        messages.success(self.request, f'Счет №{self.object.account_number} успешно обновлен')
+        messages.success(self.request, f'Счет №{form.instance.account_number} успешно обновлен')
         return response
 
     def form_invalid(self, form):
@@ -357,10 +448,9 @@ class AccountUpdateView(LoginRequiredMixin, EmployeeOrAdminRequiredMixin, Update
 class AccountDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
     """Удаление счета - классовая версия"""
     template_name = 'accounts/account_confirm_delete.html'
-    success_url = reverse_lazy('accounts:account_list')
+    success_url = ACCOUNT_LIST_URL
 
     def get_queryset(self):
-        Account = get_account_model()
         return Account.objects.all().select_related('client', 'client__user', 'currency')
 
     def delete(self, request, *args, **kwargs):
@@ -369,223 +459,106 @@ class AccountDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-# Существующие функциональные представления (остаются без изменений для совместимости)
-
-@login_required
-def account_list_old(request):
-    """Список счетов - функциональная версия"""
-    Account = get_account_model()
-
-    if request.user.role == 'client':
-        # Клиенты видят только свои счета
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            accounts = client.accounts.all()
-        except:
-            # Если клиента нет, создаем его
-            client = create_client_for_user(request.user)
-            accounts = client.accounts.all()
-            messages.warning(request, 'Ваш профиль клиента был автоматически создан.')
-    else:
-        # Сотрудники и админы видят все счета
-        accounts = Account.objects.all()
-
-    # Фильтрация
-    status = request.GET.get('status')
-    if status:
-        accounts = accounts.filter(status=status)
-
-    currency = request.GET.get('currency')
-    if currency:
-        accounts = accounts.filter(currency__code=currency)
-
-    search_query = request.GET.get('search')
-    if search_query:
-        accounts = accounts.filter(
-            models.Q(account_number__icontains=search_query) |
-            models.Q(client__full_name__icontains=search_query)
-        )
-
-    # Пагинация
-    paginator = Paginator(accounts, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Статистика
-    total_balance = accounts.aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
-
-    return render(request, 'accounts/account_list.html', {
-        'page_obj': page_obj,
-        'user_role': request.user.role,
-        'total_balance': total_balance,
-        'status': status,
-        'currency': currency,
-        'search_query': search_query
-    })
-
-
-@login_required
-def account_detail_old(request, pk):
-    """Детальная информация о счете - функциональная версия"""
-    Account = get_account_model()
-
-    account = get_object_or_404(Account, pk=pk)
-
-    # Проверка прав доступа
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            if account.client != client:
-                messages.error(request, 'У вас нет доступа к этому счету')
-                return redirect('accounts:account_list')
-        except:
-            messages.error(request, 'У вас нет доступа к этому счету')
-            return redirect('accounts:account_list')
-
-    # Получаем транзакции по счету
-    Transaction = get_transaction_model()
-    try:
-        transactions = Transaction.objects.filter(
-            models.Q(from_account=account) | models.Q(to_account=account)
-        ).select_related('from_account', 'to_account', 'currency').order_by('-created_at')[:20]
-    except:
-        transactions = []
-
-    return render(request, 'accounts/account_detail.html', {
-        'account': account,
-        'transactions': transactions
-    })
-
-
-@login_required
-def account_create_old(request):
-    """Создание нового счета - функциональная версия"""
-    AccountForm = get_account_form()
-    Client = get_client_model()
-
-    if request.method == 'POST':
-        form = AccountForm(request.POST)
-        if form.is_valid():
-            account = form.save()
-
-            # Генерация номера счета, если не указан
-            if not account.account_number:
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                account.account_number = f"ACC{timestamp}"
-                account.save()
-
-            messages.success(request, f'Счет №{account.account_number} успешно создан')
-            return redirect('accounts:account_list')
-    else:
-        form = AccountForm()
-
-    # Для сотрудников и администраторов добавляем список клиентов
-    clients = Client.objects.all()
-
-    return render(request, 'accounts/account_form.html', {
-        'form': form,
-        'clients': clients
-    })
-
-
-@login_required
-@employee_required
-def account_update_old(request, pk):
-    """Редактирование счета - функциональная версия"""
-    Account = get_account_model()
-    AccountForm = get_account_form()
-
-    account = get_object_or_404(Account, pk=pk)
-
-    if request.method == 'POST':
-        form = AccountForm(request.POST, instance=account)
-        if form.is_valid():
-            form.save()
-            messages.success(request, f'Счет №{account.account_number} успешно обновлен')
-            return redirect('accounts:account_detail', pk=account.pk)
-    else:
-        form = AccountForm(instance=account)
-
-    return render(request, 'accounts/account_form.html', {
-        'form': form,
-        'account': account
-    })
-
+# Функциональные представления для специальных операций
 
 @login_required
 def account_close(request, pk):
     """Закрытие счета"""
-    Account = get_account_model()
-    account = get_object_or_404(Account, pk=pk)
+    # Права доступа входят в условие запроса: клиенту чужой счет не найдется (404)
+    accounts = get_user_accounts(request)
 
     if request.method == 'POST':
-        # Проверяем, что счет пуст
-        if account.balance > Decimal('0.00'):
+        # Закрываем одним узким UPDATE; условие на баланс проверяется в том же запросе
+        # Одна отметка времени на запрос; дата - в локальном часовом поясе проекта
+        now = timezone.now()
+        today = timezone.localdate(now)
+        closed = accounts.filter(pk=pk, balance__lte=Decimal('0.00')).update(
+            status='closed',
+            closing_date=Coalesce('closing_date', Value(today)),
+            last_activity_date=today,
+            updated_at=now
+        )
+        if not closed:
+            if not accounts.filter(pk=pk).exists():
+                raise Http404('Счет не найден')
             messages.error(request, 'Нельзя закрыть счет с положительным балансом')
-            return redirect('accounts:account_detail', pk=account.pk)
-
-        account.status = 'closed'
-        account.closed_at = datetime.now()
-        account.save()
+            return redirect('accounts:account_detail', pk=pk)
 
+        # UPDATE не вызывает post_save: кэш списка счетов сбрасываем явно
+        Account.invalidate_list_cache_on_commit()
         messages.success(request, 'Счет успешно закрыт')
         return redirect('accounts:account_list')
 
+    account = get_account_for_user(request, pk)
     return render(request, 'accounts/account_confirm_close.html', {'account': account})
 
 
 @login_required
 def account_transactions(request, pk):
     """Транзакции по счету"""
-    Account = get_account_model()
-
-    account = get_object_or_404(Account, pk=pk)
 
-    # Проверка прав доступа
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            if account.client != client:
-                messages.error(request, 'У вас нет доступа к транзакциям этого счета')
-                return redirect('accounts:account_list')
-        except:
-            messages.error(request, 'У вас нет доступа к транзакциям этого счета')
-            return redirect('accounts:account_list')
-
-    # Получаем транзакции
-    Transaction = get_transaction_model()
+    # Клиенту чужой счет не найдется (404)
+    account = get_account_for_user(request, pk)
+
+    transaction_type = request.GET.get('type')
+    date_from = request.GET.get('date_from')
+    date_to = request.GET.get('date_to')
+
+    # Keyset-пагинация по (created_at, id): ?after=<дата-время>,<id> вместо OFFSET
+    after_created_at = after_pk = None
+    cursor = request.GET.get('after')
+    if cursor:
+        created_str, _, pk_str = cursor.rpartition(',')
+        after_created_at = parse_datetime(created_str)
+        if after_created_at is None or not pk_str.isdigit():
+            raise Http404('Некорректный курсор страницы')
+        after_pk = int(pk_str)
+
+    transactions = []
+    next_query = None
     try:
-        transactions = Transaction.objects.filter(
-            models.Q(from_account=account) | models.Q(to_account=account)
-        ).select_related('from_account', 'to_account', 'currency').order_by('-created_at')
-
         # Фильтрация
-        transaction_type = request.GET.get('type')
+        conditions = {}
         if transaction_type:
-            transactions = transactions.filter(transaction_type=transaction_type)
-
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
+            conditions['transaction_type'] = transaction_type
         if date_from:
-            transactions = transactions.filter(created_at__date__gte=date_from)
+            conditions['created_at__date__gte'] = date_from
         if date_to:
-            transactions = transactions.filter(created_at__date__lte=date_to)
-
-        # Пагинация
-        paginator = Paginator(transactions, 20)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+            conditions['created_at__date__lte'] = date_to
+
+        keyset = []
+        if after_created_at is not None:
+            keyset.append(
+                models.Q(created_at__lt=after_created_at) |
+                models.Q(created_at=after_created_at, id__lt=after_pk)
+            )
+
+        queryset = get_account_transactions(account, *keyset, **conditions).order_by('-created_at', '-id')
+
+        # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+        transactions = list(queryset[:TRANSACTIONS_PAGE_SIZE + 1])
+        if len(transactions) > TRANSACTIONS_PAGE_SIZE:
+            transactions = transactions[:TRANSACTIONS_PAGE_SIZE]
+            last = transactions[-1]
+            # Ссылка на следующую страницу сохраняет фильтры
+            params = request.GET.copy()
+            params['after'] = f'{last.created_at.isoformat()},{last.pk}'
+            next_query = params.urlencode()
 
     except Exception as e:
-        page_obj = None
         messages.error(request, f'Ошибка при загрузке транзакций: {e}')
 
+    first_query = None
+    if cursor:
+        params = request.GET.copy()
+        del params['after']
+        first_query = params.urlencode()
+
     return render(request, 'accounts/account_transactions.html', {
         'account': account,
-        'page_obj': page_obj,
+        'transactions': transactions,
+        'next_query': next_query,
+        'first_query': first_query,
         'transaction_type': transaction_type,
         'date_from': date_from,
         'date_to': date_to
@@ -595,21 +568,9 @@ def account_transactions(request, pk):
 @login_required
 def account_deposit(request, pk):
     """Пополнение счета"""
-    Account = get_account_model()
 
-    account = get_object_or_404(Account, pk=pk)
-
-    # Проверка прав доступа
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            if account.client != client:
-                messages.error(request, 'У вас нет доступа к этому счету')
-                return redirect('accounts:account_list')
-        except:
-            messages.error(request, 'У вас нет доступа к этому счету')
-            return redirect('accounts:account_list')
+    # Клиенту чужой счет не найдется (404)
+    account = get_account_for_user(request, pk)
 
     if request.method == 'POST':
         amount = request.POST.get('amount')
@@ -621,29 +582,30 @@ def account_deposit(request, pk):
                 messages.error(request, 'Сумма должна быть положительной')
                 return redirect('accounts:account_deposit', pk=account.pk)
 
-            # Создаем транзакцию пополнения
-            Transaction = get_transaction_model()
             try:
-                transaction = Transaction.objects.create(
-                    from_account=None,
-                    to_account=account,
-                    amount=amount_decimal,
-                    currency=account.currency,
-                    transaction_type='deposit',
-                    status='completed',
-                    description=description,
-                    created_at=datetime.now()
-                )
-
-                # Обновляем баланс счета
-                account.balance += amount_decimal
-                account.save()
+                # Баланс меняется одним UPDATE на стороне БД, операция пишется в той же транзакции
+                with db_transaction.atomic():
+                    # После UPDATE сразу редирект: балансы не перечитываем
+                    if not account.credit(amount_decimal, refresh=False):
+                        messages.error(request, 'Пополнение возможно только для активного счета')
+                        return redirect('accounts:account_deposit', pk=account.pk)
+
+                    # Создаем транзакцию пополнения
+                    Transaction.objects.create(
+                        from_account=None,
+                        to_account=account,
+                        amount=amount_decimal,
+                        currency=account.currency,
+                        transaction_type='deposit',
+                        status='completed',
+                        description=description
+                    )
 
                 messages.success(request, f'Счет успешно пополнен на {amount_decimal} {account.currency.code}')
                 return redirect('accounts:account_detail', pk=account.pk)
             except Exception as e:
                 messages.error(request, f'Ошибка при создании транзакции: {e}')
-        except ValueError:
+        except (ValueError, TypeError, InvalidOperation):
             messages.error(request, 'Неверный формат суммы')
 
     return render(request, 'accounts/deposit_form.html', {'account': account})
@@ -652,21 +614,9 @@ def account_deposit(request, pk):
 @login_required
 def account_withdraw(request, pk):
     """Снятие со счета"""
-    Account = get_account_model()
 
-    account = get_object_or_404(Account, pk=pk)
-
-    # Проверка прав доступа
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            if account.client != client:
-                messages.error(request, 'У вас нет доступа к этому счету')
-                return redirect('accounts:account_list')
-        except:
-            messages.error(request, 'У вас нет доступа к этому счету')
-            return redirect('accounts:account_list')
+    # Клиенту чужой счет не найдется (404)
+    account = get_account_for_user(request, pk)
 
     if request.method == 'POST':
         amount = request.POST.get('amount')
@@ -678,33 +628,30 @@ def account_withdraw(request, pk):
                 messages.error(request, 'Сумма должна быть положительной')
                 return redirect('accounts:account_withdraw', pk=account.pk)
 
-            if amount_decimal > account.balance:
-                messages.error(request, 'Недостаточно средств на счете')
-                return redirect('accounts:account_withdraw', pk=account.pk)
-
-            # Создаем транзакцию снятия
-            Transaction = get_transaction_model()
             try:
-                transaction = Transaction.objects.create(
-                    from_account=account,
-                    to_account=None,
-                    amount=amount_decimal,
-                    currency=account.currency,
-                    transaction_type='withdrawal',
-                    status='completed',
-                    description=description,
-                    created_at=datetime.now()
-                )
-
-                # Обновляем баланс счета
-                account.balance -= amount_decimal
-                account.save()
+                # Проверка остатка и списание - один условный UPDATE, без гонки чтение-изменение-запись
+                with db_transaction.atomic():
+                    # После UPDATE сразу редирект: балансы не перечитываем
+                    if not account.withdraw(amount_decimal, refresh=False):
+                        messages.error(request, 'Недостаточно средств на счете')
+                        return redirect('accounts:account_withdraw', pk=account.pk)
+
+                    # Создаем транзакцию снятия
+                    Transaction.objects.create(
+                        from_account=account,
+                        to_account=None,
+                        amount=amount_decimal,
+                        currency=account.currency,
+                        transaction_type='withdrawal',
+                        status='completed',
+                        description=description
+                    )
 
                 messages.success(request, f'Со счета снято {amount_decimal} {account.currency.code}')
                 return redirect('accounts:account_detail', pk=account.pk)
             except Exception as e:
                 messages.error(request, f'Ошибка при создании транзакции: {e}')
-        except ValueError:
+        except (ValueError, TypeError, InvalidOperation):
             messages.error(request, 'Неверный формат суммы')
 
     return render(request, 'accounts/withdraw_form.html', {'account': account})
@@ -713,7 +660,6 @@ def account_withdraw(request, pk):
 @login_required
 def account_transfer(request):
     """Перевод между счетами"""
-    Account = get_account_model()
 
     # Получаем параметр from_account из GET-запроса
     from_account_id = request.GET.get('from_account')
@@ -721,27 +667,13 @@ def account_transfer(request):
 
     if from_account_id:
         try:
-            if request.user.role == 'client':
-                Client = get_client_model()
-                client = Client.objects.get(user=request.user)
-                from_account = Account.objects.get(id=from_account_id, client=client, status='active')
-            else:
-                from_account = Account.objects.get(id=from_account_id, status='active')
+            from_account = get_user_accounts(request).get(id=from_account_id, status='active')
         except Account.DoesNotExist:
             from_account = None
             messages.warning(request, 'Указанный счет не найден или недоступен')
 
     # Получаем доступные счета для текущего пользователя
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            accounts = client.accounts.filter(status='active')
-        except Client.DoesNotExist:
-            accounts = Account.objects.none()
-            messages.warning(request, 'У вас нет доступных счетов')
-    else:
-        accounts = Account.objects.filter(status='active')
+    accounts = get_user_accounts(request).filter(status='active')
 
     if request.method == 'POST':
         from_account_id = request.POST.get('from_account')
@@ -750,58 +682,51 @@ def account_transfer(request):
         description = request.POST.get('description', 'Перевод между счетами')
 
         try:
-            from_account = Account.objects.get(id=from_account_id)
-            to_account = Account.objects.get(id=to_account_id)
             amount_decimal = Decimal(amount)
 
-            # Проверка прав доступа
-            if request.user.role == 'client':
-                try:
-                    Client = get_client_model()
-                    client = Client.objects.get(user=request.user)
-                    client_accounts = Account.objects.filter(client=client)
+            # Счет отправителя ищется среди доступных пользователю: права проверяются в том же запросе
+            try:
+                from_account = get_user_accounts(request).get(id=from_account_id)
+                # Валюта берется из кэша справочника, без JOIN
+                attach_cached_currencies([from_account])
+            except Account.DoesNotExist:
+                messages.error(request, 'У вас нет доступа к счету отправителя')
+                return redirect('accounts:account_transfer')
+            to_account = Account.objects.get(id=to_account_id)
 
-                    if from_account not in client_accounts:
-                        messages.error(request, 'У вас нет доступа к счету отправителя')
-                        return redirect('accounts:account_transfer')
-                except:
-                    messages.error(request, 'У вас нет доступа к этому счету')
-                    return redirect('accounts:account_transfer')
+            if from_account.pk == to_account.pk:
+                messages.error(request, 'Нельзя переводить средства на тот же счет')
+                return redirect('accounts:account_transfer')
 
             # Проверка суммы
             if amount_decimal <= 0:
                 messages.error(request, 'Сумма должна быть положительной')
                 return redirect('accounts:account_transfer')
 
-            if from_account.balance < amount_decimal:
-                messages.error(request, 'Недостаточно средств на счете отправителя')
-                return redirect('accounts:account_transfer')
-
             # Проверка валюты
-            if from_account.currency != to_account.currency:
+            if from_account.currency_id != to_account.currency_id:
                 messages.error(request, 'Перевод возможен только между счетами в одной валюте')
                 return redirect('accounts:account_transfer')
 
-            # Создаем транзакцию
-            Transaction = get_transaction_model()
             try:
-                transaction = Transaction.objects.create(
-                    from_account=from_account,
-                    to_account=to_account,
-                    amount=amount_decimal,
-                    currency=from_account.currency,
-                    transaction_type='transfer',
-                    status='completed',
-                    description=description,
-                    created_at=datetime.now()
-                )
-
-                # Обновляем балансы счетов
-                from_account.balance -= amount_decimal
-                from_account.save()
+                # Account.transfer блокирует оба счета (select_for_update в порядке pk),
+                # проверяет остаток под блокировкой и пишет оба баланса одним bulk_update;
+                # операция создается в той же транзакции
+                with db_transaction.atomic():
+                    if not from_account.transfer(to_account, amount_decimal):
+                        messages.error(request, 'Недостаточно средств на счете отправителя')
+                        return redirect('accounts:account_transfer')
 
-                to_account.balance += amount_decimal
-                to_account.save()
+                    # Создаем транзакцию
+                    Transaction.objects.create(
+                        from_account=from_account,
+                        to_account=to_account,
+                        amount=amount_decimal,
+                        currency=from_account.currency,
+                        transaction_type='transfer',
+                        status='completed',
+                        description=description
+                    )
 
                 messages.success(request,
                                  f'Перевод на сумму {amount_decimal} {from_account.currency.code} выполнен успешно')
@@ -810,9 +735,13 @@ def account_transfer(request):
                 messages.error(request, f'Ошибка при выполнении перевода: {e}')
         except Account.DoesNotExist:
             messages.error(request, 'Один из счетов не найден')
-        except ValueError:
+        except (ValueError, TypeError, InvalidOperation):
             messages.error(request, 'Неверный формат суммы')
 
+    # Проверка выполняет выборку счетов, и шаблон использует ее результат - без отдельного запроса профиля
+    if get_user_role(request) == 'client' and not accounts:
+        messages.warning(request, 'У вас нет доступных счетов')
+
     # Передаем from_account в контекст, даже если он None
     return render(request, 'accounts/transfer_form.html', {
         'accounts': accounts,
@@ -824,50 +753,54 @@ def account_transfer(request):
 @employee_required
 def currency_list(request):
     """Список валют"""
-    Currency = get_currency_model()
-    currencies = Currency.objects.all()
+    # Шаблону нужны только значения полей, экземпляры моделей не создаем;
+    # строка заголовка собирается в БД. Справочник меняется редко, поэтому строки
+    # кэшируются; сигналы Currency сбрасывают кэш (Currency.clear_cache)
+    currencies = cache.get_or_set(
+        Currency.LIST_CACHE_KEY,
+        lambda: list(Currency.objects.annotate(
+            display=Concat('name', Value(' ('), 'code', Value(')'), output_field=models.CharField())
+        ).values('code', 'display', 'symbol', 'exchange_rate', 'is_active')),
+        Currency.CACHE_TIMEOUT
+    )
     return render(request, 'accounts/currency_list.html', {'currencies': currencies})
 
 
 @login_required
 def account_statistics(request):
     """Статистика по счетам"""
-    Account = get_account_model()
 
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            accounts = client.accounts.all()
-        except:
-            accounts = Account.objects.none()
-    else:
-        accounts = Account.objects.all()
-
-    # Общая статистика
-    total_balance = accounts.aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
-    avg_balance = accounts.aggregate(avg=Avg('balance'))['avg'] or Decimal('0.00')
-    total_accounts = accounts.count()
-
-    # Статистика по статусам
+    # Клиенту - только свои счета (фильтр по client__user, без отдельного запроса профиля)
+    accounts = get_user_accounts(request)
+
+    # Общая статистика - одним запросом
+    totals = accounts.aggregate(
+        total_balance=Sum('balance'),
+        avg_balance=Avg('balance'),
+        total_accounts=Count('id')
+    )
+
+    # Статистика по статусам. Явная сортировка заменяет сортировку модели
+    # по opening_date, которая иначе попала бы в GROUP BY и разбила группы
     status_stats = accounts.values('status').annotate(
         count=Count('id'),
         total_balance=Sum('balance')
-    )
+    ).order_by('status')
 
-    # Статистика по валютам
-    currency_stats = accounts.values('currency__code', 'currency__name').annotate(
+    # Статистика по валютам: группировка по currency_id без JOIN,
+    # код и название подставляются из кэша справочника валют
+    currency_stats = add_currency_names(accounts.values('currency_id').annotate(
         count=Count('id'),
         total_balance=Sum('balance')
-    )
+    ).order_by('currency_id'))
 
     return render(request, 'accounts/account_statistics.html', {
-        'total_balance': total_balance,
-        'avg_balance': avg_balance,
-        'total_accounts': total_accounts,
-        'status_stats': status_stats,
+        'total_balance': totals['total_balance'] or Decimal('0.00'),
+        'avg_balance': totals['avg_balance'] or Decimal('0.00'),
+        'total_accounts': totals['total_accounts'],
+        'status_stats': list(status_stats),
         'currency_stats': currency_stats,
-        'user_role': request.user.role
+        'user_role': get_user_role(request)
     })
 
 
@@ -875,69 +808,86 @@ def account_statistics(request):
 @employee_required
 def export_accounts_csv(request):
     """Экспорт счетов в CSV"""
-    Account = get_account_model()
-    accounts = Account.objects.all().select_related('client', 'currency')
-
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    # Строки форматирует БД: даты приводятся к тексту, статус - к отображаемому названию,
+    # поэтому для каждой строки не создается объект модели. Читаем порциями
+    rows_qs = Account.objects.order_by('pk').values_list(
+        'account_number',
+        Coalesce('client__full_name', Value('')),
+        'balance',
+        'currency_id',
+        Case(
+            *[When(status=value, then=Value(label)) for value, label in Account.STATUS_CHOICES],
+            default='status',
+            output_field=models.CharField()
+        ),
+        Cast(TruncDate('created_at'), models.CharField()),
+        Coalesce(Cast('closing_date', models.CharField()), Value(''))
+    ).iterator(chunk_size=2000)
+    # Коды валют - из кэша справочника вместо JOIN на каждую строку
+    currency_codes = {pk: currency.code for pk, currency in Currency.get_cached_map().items()}
+
+    def rows():
+        # Строки копятся в буфере и отдаются уже закодированными порциями ~CSV_EXPORT_CHUNK_SIZE:
+        # без отдельной записи и перекодирования на каждую строку
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+
+        # BOM UTF-8 для корректного отображения кириллицы в Excel
+        yield codecs.BOM_UTF8
+        writer.writerow(['Номер счета', 'Клиент', 'Баланс', 'Валюта', 'Статус', 'Дата открытия', 'Дата закрытия'])
+
+        for number, client_name, balance, currency_id, status, opened, closed in rows_qs:
+            writer.writerow([
+                number, client_name, balance, currency_codes.get(currency_id, ''), status, opened, closed
+            ])
+            if buffer.tell() >= CSV_EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue().encode('utf-8')
+
+    # Строки отдаются клиенту по мере чтения из БД - память не растет с размером выгрузки
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="accounts.csv"'
-
-    # Пишем BOM для корректного отображения кириллицы в Excel
-    response.write('\ufeff')
-
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow(['Номер счета', 'Клиент', 'Баланс', 'Валюта', 'Статус', 'Дата открытия', 'Дата закрытия'])
-
-    for account in accounts:
-        writer.writerow([
-            account.account_number,
-            account.client.full_name if account.client else '',
-            str(account.balance),
-            account.currency.code if account.currency else '',
-            account.get_status_display(),
-            account.created_at.strftime('%Y-%m-%d'),
-            account.closed_at.strftime('%Y-%m-%d') if account.closed_at else ''
-        ])
-
     return response
 
 
 @login_required
 def account_chart_data(request):
     """Данные для графиков по счетам (JSON API)"""
-    Account = get_account_model()
 
-    if request.user.role == 'client':
-        try:
-            Client = get_client_model()
-            client = Client.objects.get(user=request.user)
-            accounts = client.accounts.all()
-        except:
-            accounts = Account.objects.none()
-    else:
-        accounts = Account.objects.all()
-
-    # Данные для графика распределения по валютам
-    currency_data = accounts.values('currency__code').annotate(
-        total=Sum('balance'),
-        count=Count('id')
-    ).order_by('-total')
+    # Клиенту - только свои счета (фильтр по client__user, без отдельного запроса профиля)
+    accounts = get_user_accounts(request)
 
-    # Данные для графика распределения по статусам
-    status_data = accounts.values('status').annotate(
+    # Все три графика строятся из одной группировки по (валюта, статус, месяц открытия):
+    # групп немного, и разрезы досчитываются в Python вместо трех отдельных запросов
+    groups = accounts.annotate(month=TruncMonth('created_at')).values(
+        'currency_id', 'status', 'month'
+    ).annotate(
+        total=Sum('balance'),
         count=Count('id')
-    ).order_by('status')
+    ).order_by()
 
-    # Данные для графика динамики открытия счетов
-    timeline_data = accounts.extra(
-        select={'month': "DATE_TRUNC('month', created_at)"}
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
+    by_currency, by_status, by_month = {}, {}, {}
+    for group in groups:
+        currency = by_currency.setdefault(group['currency_id'], {
+            'currency_id': group['currency_id'], 'total': Decimal('0.00'), 'count': 0
+        })
+        currency['total'] += group['total']
+        currency['count'] += group['count']
+        by_status[group['status']] = by_status.get(group['status'], 0) + group['count']
+        by_month[group['month']] = by_month.get(group['month'], 0) + group['count']
 
     data = {
-        'currency_data': list(currency_data),
-        'status_data': list(status_data),
-        'timeline_data': list(timeline_data),
+        # Распределение по валютам (коды - из кэша справочника, без JOIN)
+        'currency_data': add_currency_names(
+            sorted(by_currency.values(), key=lambda row: row['total'], reverse=True), with_name=False
+        ),
+        # Распределение по статусам
+        'status_data': [{'status': status, 'count': count} for status, count in sorted(by_status.items())],
+        # Динамика открытия счетов
+        'timeline_data': [{'month': month, 'count': count} for month, count in sorted(by_month.items())],
     }
-
-    return JsonResponse(data, safe=False)
\ No newline at end of file
+    # Компактные разделители: без пробелов после ',' и ':'
+    return JsonResponse(data, safe=False, json_dumps_params={'separators': (',', ':')})
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AuditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'audit'
+
+    def ready(self):
+        """
+        Регистрируем сигналы при запуске приложения
+        """
+        from . import signals
@@ -1,31 +1,98 @@
+import logging
+import re
+import threading
+import uuid
+
 from django.utils.deprecation import MiddlewareMixin
 from django.apps import apps
+from django.utils import timezone
+
+from .writer import write
+
+logger = logging.getLogger(__name__)
+
+# Логируются только запросы, изменяющие данные; метод определяет действие (AuditLog.ACTION_TYPES)
+METHOD_ACTIONS = {
+    'POST': 'create',
+    'PUT': 'update',
+    'PATCH': 'update',
+    'DELETE': 'delete',
+}
+AUDITED_METHODS = frozenset(METHOD_ACTIONS)
+
+# Статические файлы, медиафайлы и админка в журнал не попадают
+_is_skipped_path = re.compile(r'/(?:static|media|admin)/').match
+
+# Вход, переводы и блокировка карт пишутся в журнал сразу, без фоновой очереди (audit.writer)
+_is_security_path = re.compile(
+    r'/(?:users/login|accounts/transfer|transactions/transfer|cards/\d+/(?:un)?block)/'
+).match
+
+
+# Состояние текущего запроса в потоке: ID сессии аудита, общий для всех его записей
+_request_state = threading.local()
+
+
+def get_audit_session_id():
+    """
+    ID сессии аудита текущего запроса. Создается при первом обращении,
+    вне запроса (фоновые задачи, команды) - None
+    """
+    if not getattr(_request_state, 'active', False):
+        return None
+    if _request_state.session_id is None:
+        _request_state.session_id = uuid.uuid4()
+    return _request_state.session_id
 
 
 class AuditMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
         self.get_response = get_response
+        # Модель AuditLog разрешается один раз, при первом логируемом запросе
+        self._audit_log_model = None
+        self._modules = frozenset()
 
     def __call__(self, request):
-        # Пропускаем статические файлы и админку
-        if request.path.startswith('/static/') or request.path.startswith('/admin/'):
+        # ID сессии аудита создается лениво - только если запрос что-то записал в журнал
+        _request_state.active = True
+        _request_state.session_id = None
+        try:
+            return self.process(request)
+        finally:
+            _request_state.active = False
+
+    def process(self, request):
+        # GET/HEAD, статические файлы и админку не логируем - сразу отдаем ответ
+        if request.method not in AUDITED_METHODS or _is_skipped_path(request.path):
             return self.get_response(request)
 
         response = self.get_response(request)
 
-        # Логируем действия, требующие изменения данных
-        if request.method in ['POST', 'PUT', 'DELETE'] and request.user.is_authenticated:
-            try:
-                # Ленивая загрузка модели AuditLog
-                AuditLog = apps.get_model('audit', 'AuditLog')
-                action = f"{request.method} {request.path}"
-                AuditLog.objects.create(
-                    user=request.user,
-                    action=action,
-                    table_name='unknown',
-                    record_id=0
-                )
-            except Exception:
-                pass  # Игнорируем ошибки логирования
-
-        return response
\ No newline at end of file
+        # Логируем действия, требующие изменения данных. Запись в БД выполняет
+        # фоновый поток, ответ пользователю не ждет INSERT; события безопасности - сразу
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return response
+
+        AuditLog = self._audit_log_model
+        if AuditLog is None:
+            AuditLog = self._audit_log_model = apps.get_model('audit', 'AuditLog')
+            self._modules = frozenset(code for code, _ in AuditLog.MODULE_CHOICES)
+        # Модуль - по первому сегменту пути (/accounts/... -> accounts), иначе system
+        module = request.path.split('/', 2)[1]
+        queued = write(AuditLog(
+            user_id=user.pk,
+            action=METHOD_ACTIONS[request.method],
+            module=module if module in self._modules else 'system',
+            description=f"{request.method} {request.path}",
+            table_name='unknown',
+            record_id=0,
+            timestamp=timezone.now(),
+            session_id=get_audit_session_id()
+        ), sync=bool(_is_security_path(request.path)))
+        if not queued:
+            # Очередь переполнена - запись отбрасывается, запрос не тормозим
+            logger.warning('Очередь журнала аудита переполнена, запись %s %s отброшена',
+                           request.method, request.path)
+
+        return response
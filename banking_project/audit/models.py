@@ -1,8 +1,14 @@
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import connection, models
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+import json
 import uuid
 
+from .middleware import get_audit_session_id
+from .writer import write
+
 
 class AuditLog(models.Model):
     """
@@ -104,9 +110,11 @@ class AuditLog(models.Model):
         blank=True,
         verbose_name='Связанные объекты'
     )
-    # НОВОЕ ПОЛЕ: Уникальный идентификатор для группировки связанных действий
+    # НОВОЕ ПОЛЕ: Уникальный идентификатор для группировки связанных действий.
+    # Общий для всех записей одного запроса (audit.middleware); у фоновых задач - пустой
     session_id = models.UUIDField(
-        default=uuid.uuid4,
+        null=True,
+        blank=True,
         editable=False,
         verbose_name='ID сессии'
     )
@@ -133,15 +141,19 @@ class AuditLog(models.Model):
     class Meta:
         verbose_name = 'Запись аудита'
         verbose_name_plural = 'Записи аудита'
-        ordering = ['-timestamp']
+        # Порядок по id совпадает с порядком записи: BRIN по timestamp не отдает строки
+        # отсортированными, а первичный ключ читается с конца без сортировки всей таблицы
+        ordering = ['-id']
+        # Каждый индекс обновляется при каждой записи журнала. Отдельных индексов по
+        # is_successful и severity нет: селективность низкая, запросов с такими фильтрами нет
         indexes = [
             models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['action', 'timestamp']),
             models.Index(fields=['module', 'timestamp']),
             models.Index(fields=['table_name', 'record_id']),
-            models.Index(fields=['timestamp']),
-            models.Index(fields=['is_successful']),
-            models.Index(fields=['severity']),  # НОВЫЙ ИНДЕКС
+            # Журнал только дополняется, и timestamp растет вместе с физическим порядком строк:
+            # BRIN хранит диапазоны значений на группу страниц и почти не увеличивает запись
+            BrinIndex(fields=['timestamp'], name='auditlog_ts_brin', pages_per_range=32),
             models.Index(fields=['session_id']),  # НОВЫЙ ИНДЕКС
         ]
 
@@ -158,9 +170,11 @@ class AuditLog(models.Model):
         Статический метод для удобного логирования действий
         """
         if not session_id:
-            session_id = uuid.uuid4()
+            session_id = get_audit_session_id()
 
-        return cls.objects.create(
+        # Запись уходит в очередь фоновой записи пачками (audit.writer), события безопасности
+        # сохраняются сразу; если очередь переполнена - тоже сохраняем сразу, событие не теряется
+        entry = cls(
             user=user,
             action=action,
             module=module,
@@ -178,6 +192,9 @@ class AuditLog(models.Model):
             execution_time=execution_time,
             session_id=session_id
         )
+        if not write(entry):
+            entry.save()
+        return entry
 
     @classmethod
     def log_interest_accrual(cls, user, deposit, amount, is_successful=True, error_message=''):
@@ -285,6 +302,44 @@ class AuditLog(models.Model):
         )
 
 
+# Значения, которые считаются истиной для настроек типа boolean
+SETTING_TRUE_VALUES = frozenset(('true', '1', 'yes', 'on'))
+
+# Преобразование строкового значения настройки по типу данных; строки возвращаются как есть
+SETTING_CONVERTERS = {
+    'integer': int,
+    'float': float,
+    'boolean': lambda value: value.lower() in SETTING_TRUE_VALUES,
+    'json': json.loads,
+}
+
+# Значения по умолчанию при ошибке преобразования (фабрики - чтобы не делить изменяемый {})
+SETTING_DEFAULTS = {
+    'integer': int,
+    'float': float,
+    'boolean': bool,
+    'json': dict,
+}
+
+
+# Вставка или обновление настройки по уникальному ключу (PostgreSQL), см. SystemSettings.set_setting
+UPSERT_SETTING_SQL = """
+    INSERT INTO {table} (key, value, data_type, category, description, is_public, updated_by_id,
+                         version, is_active, created_at, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, 1, true, now(), now())
+    ON CONFLICT (key) DO UPDATE SET
+        value = EXCLUDED.value,
+        data_type = EXCLUDED.data_type,
+        category = EXCLUDED.category,
+        description = EXCLUDED.description,
+        is_public = EXCLUDED.is_public,
+        updated_by_id = EXCLUDED.updated_by_id,
+        version = {table}.version + 1,
+        updated_at = now()
+    RETURNING *
+"""
+
+
 class SystemSettings(models.Model):
     """
     Настройки системы для аудита и мониторинга
@@ -348,6 +403,11 @@ class SystemSettings(models.Model):
         verbose_name='Активна'
     )
 
+    # Кэш значений get_setting; изменения через set_setting и сохранение/удаление
+    # записи (audit.signals) сбрасывают его сразу
+    CACHE_KEY_PREFIX = 'audit:setting:'
+    CACHE_TIMEOUT = 300
+
     class Meta:
         verbose_name = 'Настройка системы'
         verbose_name_plural = 'Настройки системы'
@@ -358,58 +418,70 @@ class SystemSettings(models.Model):
 
     def get_typed_value(self):
         """Получение значения в правильном типе данных"""
+        converter = SETTING_CONVERTERS.get(self.data_type)
+        if converter is None:
+            return self.value
         try:
-            if self.data_type == 'integer':
-                return int(self.value)
-            elif self.data_type == 'float':
-                return float(self.value)
-            elif self.data_type == 'boolean':
-                return self.value.lower() in ('true', '1', 'yes', 'on')
-            elif self.data_type == 'json':
-                import json
-                return json.loads(self.value)
-            else:
-                return self.value
-        except (ValueError, TypeError, json.JSONDecodeError):
-            # Возвращаем значение по умолчанию в случае ошибки
-            if self.data_type == 'integer':
-                return 0
-            elif self.data_type == 'float':
-                return 0.0
-            elif self.data_type == 'boolean':
-                return False
-            elif self.data_type == 'json':
-                return {}
-            else:
-                return self.value
+            return converter(self.value)
+        except (ValueError, TypeError, AttributeError):
+            # Возвращаем значение по умолчанию в случае ошибки (JSONDecodeError - подкласс ValueError)
+            return SETTING_DEFAULTS[self.data_type]()
+
+    @classmethod
+    def get_cache_key(cls, key):
+        return f'{cls.CACHE_KEY_PREFIX}{key}'
 
     @classmethod
     def get_setting(cls, key, default=None):
-        """Получение значения настройки по ключу"""
-        try:
-            setting = cls.objects.get(key=key, is_active=True)
-            return setting.get_typed_value()
-        except cls.DoesNotExist:
-            return default
+        """
+        Получение значения настройки по ключу.
+        Значение уже приведенного типа кэшируется; отсутствие настройки тоже кэшируется,
+        чтобы не обращаться к БД за несуществующим ключом
+        """
+        cache_key = cls.get_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            try:
+                cached = (True, cls.objects.get(key=key, is_active=True).get_typed_value())
+            except cls.DoesNotExist:
+                cached = (False, None)
+            cache.set(cache_key, cached, cls.CACHE_TIMEOUT)
+
+        found, value = cached
+        return value if found else default
+
+    @classmethod
+    def clear_cache(cls, key):
+        """Сброс кэша настройки"""
+        cache.delete(cls.get_cache_key(key))
 
     @classmethod
     def set_setting(cls, key, value, data_type='string', category='general',
                     description='', is_public=False, user=None):
         """Установка значения настройки"""
         if isinstance(value, (dict, list)):
-            import json
             value = json.dumps(value, ensure_ascii=False)
             data_type = 'json'
         elif isinstance(value, bool):
             value = 'true' if value else 'false'
             data_type = 'boolean'
         elif isinstance(value, (int, float)):
-            value = str(value)
             data_type = 'float' if isinstance(value, float) else 'integer'
+            value = str(value)
         else:
             value = str(value)
             data_type = 'string'
 
+        if connection.vendor == 'postgresql':
+            # Одним запросом: INSERT ... ON CONFLICT DO UPDATE ... RETURNING. Версия
+            # увеличивается на стороне БД - без чтения строки и гонки между запросами
+            setting = cls.objects.raw(
+                UPSERT_SETTING_SQL.format(table=cls._meta.db_table),
+                [key, value, data_type, category, description, is_public, user.pk if user else None]
+            )[0]
+            cls.clear_cache(key)
+            return setting
+
         setting, created = cls.objects.get_or_create(
             key=key,
             defaults={
@@ -432,9 +504,14 @@ class SystemSettings(models.Model):
             setting.version += 1
             setting.save()
 
+        cls.clear_cache(key)
         return setting
 
 
+# Единицы размера резервной копии (степени 1024), см. BackupHistory.get_readable_size
+BACKUP_SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+
+
 class BackupHistory(models.Model):
     """
     История резервных копий
@@ -576,14 +653,12 @@ class BackupHistory(models.Model):
 
     def get_readable_size(self):
         """Человеко-читаемый размер файла"""
-        if self.backup_size < 1024:
-            return f"{self.backup_size} B"
-        elif self.backup_size < 1024 * 1024:
-            return f"{self.backup_size / 1024:.2f} KB"
-        elif self.backup_size < 1024 * 1024 * 1024:
-            return f"{self.backup_size / (1024 * 1024):.2f} MB"
-        else:
-            return f"{self.backup_size / (1024 * 1024 * 1024):.2f} GB"
+        size = self.backup_size
+        # Порядок единицы - по числу двоичных разрядов: каждые 10 бит - следующая единица
+        index = min((size.bit_length() - 1) // 10, len(BACKUP_SIZE_UNITS) - 1) if size > 0 else 0
+        if index == 0:
+            return f"{size} B"
+        return f"{size / (1 << (10 * index)):.2f} {BACKUP_SIZE_UNITS[index]}"
 
     def is_integrity_valid(self, current_checksum):
         """Проверка целостности бэкапа"""
@@ -0,0 +1,16 @@
+"""
+Сигналы приложения аудита
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import SystemSettings
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+def clear_system_setting_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш настройки при любом изменении записи (в том числе из админки)
+    """
+    SystemSettings.clear_cache(instance.key)
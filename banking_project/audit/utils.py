@@ -2,6 +2,21 @@ from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from .middleware import get_audit_session_id
+from .writer import write
+
+
+# Колонки записи аудита для списков: без JSON-полей old_values/new_values/related_objects,
+# которые не выводятся, но занимают больше всего места и разбираются через json.loads
+AUDIT_LOG_SUMMARY_FIELDS = (
+    'id', 'user_id', 'action', 'module', 'table_name', 'record_id',
+    'description', 'timestamp', 'is_successful', 'severity',
+)
+
+
+# Названия причин блокировки карты (Card.BLOCK_REASONS) - заполняются при первом обращении
+_block_reason_labels = None
+
 
 def get_audit_log_model():
     """Ленивая загрузка модели AuditLog"""
@@ -19,7 +34,8 @@ def get_card_model():
         return None
 
 
-def log_event(user, action, model_name, object_id=None, details=None, ip_address=None, user_agent=None):
+def log_event(user, action, model_name, object_id=None, details=None, ip_address=None, user_agent=None,
+              module='cards'):
     """
     Основная функция логирования событий в системе аудита
     """
@@ -28,17 +44,22 @@ def log_event(user, action, model_name, object_id=None, details=None, ip_address
         return None
 
     try:
+        # Имя модели и ID объекта хранятся в колонках table_name/record_id, подробности - в description
         audit_log = AuditLog(
             user=user,
             action=action,
-            model_name=model_name,
-            object_id=object_id,
-            details=details or '',
+            module=module,
+            table_name=model_name,
+            record_id=object_id,
+            description=details or '',
             ip_address=ip_address,
-            user_agent=user_agent,
-            timestamp=timezone.now()
+            user_agent=user_agent or '',
+            timestamp=timezone.now(),
+            session_id=get_audit_session_id()
         )
-        audit_log.save()
+        # Запись - фоновыми пачками (audit.writer); смена статуса карты и переполненная очередь - сразу
+        if not write(audit_log):
+            audit_log.save()
         return audit_log
     except Exception as e:
         # Логируем ошибку, но не прерываем выполнение основной логики
@@ -46,6 +67,14 @@ def log_event(user, action, model_name, object_id=None, details=None, ip_address
         return None
 
 
+def get_block_reason_labels(Card):
+    """Словарь {код: название} причин блокировки карты, строится один раз"""
+    global _block_reason_labels
+    if _block_reason_labels is None:
+        _block_reason_labels = dict(Card.BLOCK_REASONS)
+    return _block_reason_labels
+
+
 def log_card_status_change(user, card, old_status, new_status, reason=None, block_reason=None, ip_address=None,
                            user_agent=None):
     """
@@ -77,7 +106,7 @@ def log_card_status_change(user, card, old_status, new_status, reason=None, bloc
 
     if block_reason:
         # Получаем отображаемое значение причины блокировки
-        block_reason_display = dict(Card.BLOCK_REASONS).get(block_reason, block_reason)
+        block_reason_display = get_block_reason_labels(Card).get(block_reason, block_reason)
         details_parts.append(f"Тип блокировки: {block_reason_display}")
 
     details = "\n".join(details_parts)
@@ -186,16 +215,18 @@ def get_card_audit_logs(card_id, days=30):
     Получение аудит-логов для конкретной карты за указанный период
     """
     AuditLog = get_audit_log_model()
-    if not AuditLog:
-        return AuditLog.objects.none()
+    if AuditLog is None:
+        # Приложение аудита не установлено - записей нет (у None нет .objects)
+        return []
 
     start_date = timezone.now() - timezone.timedelta(days=days)
 
+    # Таблица и ID карты хранятся в table_name/record_id; JSON-поля не загружаем
     return AuditLog.objects.filter(
-        model_name='Card',
-        object_id=card_id,
+        table_name='Card',
+        record_id=card_id,
         timestamp__gte=start_date
-    ).order_by('-timestamp')
+    ).only(*AUDIT_LOG_SUMMARY_FIELDS).order_by('-timestamp')
 
 
 def get_user_card_actions(user_id, days=30):
@@ -203,8 +234,9 @@ def get_user_card_actions(user_id, days=30):
     Получение всех действий пользователя с картами за указанный период
     """
     AuditLog = get_audit_log_model()
-    if not AuditLog:
-        return AuditLog.objects.none()
+    if AuditLog is None:
+        # Приложение аудита не установлено - записей нет (у None нет .objects)
+        return []
 
     start_date = timezone.now() - timezone.timedelta(days=days)
     card_actions = ['CARD_CREATED', 'CARD_BLOCKED', 'CARD_UNBLOCKED',
@@ -214,7 +246,7 @@ def get_user_card_actions(user_id, days=30):
         user_id=user_id,
         action__in=card_actions,
         timestamp__gte=start_date
-    ).order_by('-timestamp')
+    ).only(*AUDIT_LOG_SUMMARY_FIELDS).order_by('-timestamp')
 
 
 # Функция для регистрации в конфигурации приложения
@@ -64,7 +64,7 @@ def audit_log(request):
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
 
-    logs = AuditLog.objects.all().order_by('-timestamp')
+    logs = AuditLog.objects.all()
 
     if user_id:
         logs = logs.filter(user_id=user_id)
@@ -77,6 +77,11 @@ def audit_log(request):
     if date_to:
         logs = logs.filter(timestamp__date__lte=date_to)
 
+    # Новые записи сначала. С фильтром по пользователю, действию или модулю порядок дает
+    # составной индекс (..., timestamp); без них - первичный ключ: BRIN по timestamp
+    # не отдает строки отсортированными
+    logs = logs.order_by('-timestamp' if user_id or action or module else '-id')
+
     # Пагинация (упрощенная)
     page = int(request.GET.get('page', 1))
     per_page = 50
@@ -0,0 +1,135 @@
+"""
+Фоновая запись журнала аудита.
+Записи копятся в очереди процесса и пишутся отдельным потоком пачками через bulk_create:
+запрос пользователя не ждет INSERT, а обновление индексов AuditLog делится на всю пачку.
+
+Цена фоновой записи:
+- поток пишет вне транзакции запроса: если запрос откатился, его записи в журнале остаются;
+- очередь живет в памяти процесса: при аварийном завершении (SIGKILL, OOM) до atexit
+  накопленные записи теряются.
+Поэтому события безопасности (SECURITY_ACTIONS, а также вход, переводы и блокировка карт
+в AuditMiddleware) сохраняются сразу через save() - см. write()
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import DatabaseError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = 100000
+# Размер пачки по умолчанию; переопределяется настройкой audit.batch_size
+AUDIT_BATCH_SIZE = 1000
+AUDIT_FLUSH_INTERVAL = 1.0
+
+# Действия, которые не откладываются в очередь: вход/выход и смена статуса карты
+SECURITY_ACTIONS = frozenset({
+    'login', 'logout',
+    'CARD_BLOCKED', 'CARD_UNBLOCKED', 'CARD_MARKED_LOST', 'CARD_MARKED_STOLEN',
+    'CARD_CLOSED', 'CARD_STATUS_CHANGED',
+})
+
+_audit_queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+_writer_lock = threading.Lock()
+_writer_thread = None
+
+
+def _get_batch_size():
+    """Размер пачки из настроек системы (читается при запуске потока записи)"""
+    from .models import SystemSettings
+
+    try:
+        batch_size = int(SystemSettings.get_setting('audit.batch_size', AUDIT_BATCH_SIZE))
+    except (DatabaseError, ValueError, TypeError):
+        return AUDIT_BATCH_SIZE
+    return batch_size if batch_size > 0 else AUDIT_BATCH_SIZE
+
+
+def _drain(batch_size, timeout=None):
+    """Забирает из очереди до batch_size записей, ожидая первую не дольше timeout секунд"""
+    batch = []
+    try:
+        batch.append(_audit_queue.get(timeout=timeout) if timeout else _audit_queue.get_nowait())
+        while len(batch) < batch_size:
+            batch.append(_audit_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _write_batch(batch, batch_size):
+    """Запись пачки многострочным INSERT; при ошибке - по одной, чтобы не терять остальные"""
+    # Модель берется у самих записей - без обращения к реестру приложений
+    AuditLog = type(batch[0])
+    try:
+        AuditLog.objects.bulk_create(batch, batch_size=batch_size)
+    except DatabaseError:
+        failed = 0
+        for entry in batch:
+            try:
+                entry.save()
+            except DatabaseError:
+                failed += 1
+        if failed:
+            logger.warning('Не удалось записать в журнал аудита %s из %s записей', failed, len(batch))
+
+
+def flush_audit_queue():
+    """Синхронная запись всех накопленных записей (при завершении процесса)"""
+    batch = _drain(AUDIT_BATCH_SIZE)
+    while batch:
+        _write_batch(batch, AUDIT_BATCH_SIZE)
+        batch = _drain(AUDIT_BATCH_SIZE)
+
+
+def _writer_loop():
+    batch_size = _get_batch_size()
+    while True:
+        batch = _drain(batch_size, timeout=AUDIT_FLUSH_INTERVAL)
+        if batch:
+            # Фоновый поток держит свое соединение: закрываем устаревшее по CONN_MAX_AGE
+            close_old_connections()
+            _write_batch(batch, batch_size)
+
+
+def _ensure_writer():
+    """
+    Запуск фонового потока записи при первой записи в процессе.
+    Не в AppConfig.ready(): поток, запущенный до fork рабочих процессов, в них не переживет fork
+    """
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name='audit-writer', daemon=True)
+            _writer_thread.start()
+
+
+def enqueue(entry):
+    """
+    Ставит несохраненную запись AuditLog в очередь на запись.
+    Возвращает False, если очередь переполнена - решение о записи остается за вызывающим кодом
+    """
+    _ensure_writer()
+    try:
+        _audit_queue.put_nowait(entry)
+    except queue.Full:
+        return False
+    return True
+
+
+def write(entry, sync=False):
+    """
+    Запись в журнал: события безопасности (sync или действие из SECURITY_ACTIONS) сохраняются
+    сразу, в транзакции вызывающего кода; остальные - через очередь (см. enqueue)
+    """
+    if sync or entry.action in SECURITY_ACTIONS:
+        entry.save()
+        return True
+    return enqueue(entry)
+
+
+atexit.register(flush_audit_queue)
@@ -365,6 +365,10 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_AGE = 1209600  # 2 недели в секундах
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Флеш-сообщения хранятся только в cookie: без отката в сессию (cached_db),
+# который записывал бы сессию в БД на POST-запросах с редиректом
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # Internationalization
 FORMAT_MODULE_PATH = [
     'banking_project.formats',
@@ -1,7 +1,9 @@
 from django.shortcuts import redirect
 from django.http import HttpResponseForbidden
 from django.urls import reverse
-from django.apps import apps
+
+from users.decorators import get_user_role
+from .models import Client
 
 
 class ClientRequiredMixin:
@@ -14,9 +16,6 @@ class ClientRequiredMixin:
         if not request.user.is_authenticated:
             return redirect('users:login')
 
-        # Получаем модель Client
-        Client = apps.get_model('clients', 'Client')
-
         # Для пользователей с ролью 'client'
         if request.user.role == 'client':
             try:
@@ -27,7 +26,7 @@ class ClientRequiredMixin:
                 create_client_profile(Client, request.user, created=True)
 
         # Для сотрудников и администраторов тоже нужен Client для работы с системой
-        elif request.user.role in ['employee', 'admin']:
+        elif request.user.is_staff_role:
             try:
                 request.user.client_profile
             except Client.DoesNotExist:
@@ -42,13 +41,13 @@ class RoleRequiredMixin:
     """
     Миксин для проверки ролей пользователя
     """
-    allowed_roles = []
+    allowed_roles = frozenset()
 
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('users:login')
 
-        if request.user.role not in self.allowed_roles:
+        if get_user_role(request) not in self.allowed_roles:
             return HttpResponseForbidden("У вас нет доступа к этой странице.")
 
         return super().dispatch(request, *args, **kwargs)
@@ -72,15 +71,23 @@ class ClientAccessMixin:
         return super().dispatch(request, *args, **kwargs)
 
 
-class EmployeeOrAdminRequiredMixin(RoleRequiredMixin):
+class EmployeeOrAdminRequiredMixin:
     """
-    Миксин для требований сотрудника или администратора
+    Миксин для требований сотрудника или администратора (см. User.is_staff_role)
     """
-    allowed_roles = ['employee', 'admin']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return redirect('users:login')
+
+        if not request.user.is_staff_role:
+            return HttpResponseForbidden("У вас нет доступа к этой странице.")
+
+        return super().dispatch(request, *args, **kwargs)
 
 
 class AdminRequiredMixin(RoleRequiredMixin):
     """
     Миксин для требований администратора
     """
-    allowed_roles = ['admin']
\ No newline at end of file
+    allowed_roles = frozenset({'admin'})
\ No newline at end of file
@@ -0,0 +1,14 @@
+from .models import Client
+
+
+def get_request_client(request):
+    """
+    Профиль клиента текущего пользователя (None, если профиля нет или пользователь анонимный).
+    Запрашивается один раз за запрос и запоминается на объекте request
+    """
+    if not hasattr(request, '_cached_client'):
+        user = request.user
+        request._cached_client = (
+            Client.objects.filter(user=user).first() if user.is_authenticated else None
+        )
+    return request._cached_client
@@ -2,15 +2,17 @@ from django.core.exceptions import PermissionDenied
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404
 
+from users.decorators import get_user_role
+
 
 class RoleRequiredMixin:
     """Миксин для проверки ролей пользователя"""
-    allowed_roles = []
+    allowed_roles = frozenset()
 
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return self.handle_no_permission()
-        if request.user.role not in self.allowed_roles:
+        if get_user_role(request) not in self.allowed_roles:
             raise PermissionDenied("У вас нет прав для доступа к этой странице")
         return super().dispatch(request, *args, **kwargs)
 
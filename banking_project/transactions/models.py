@@ -160,8 +160,10 @@ class Transaction(models.Model):
         verbose_name_plural = 'Транзакции'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['from_account', 'created_at']),
-            models.Index(fields=['to_account', 'created_at']),
+            # История операций счета: фильтр по счету и keyset-порядок (-created_at, -id)
+            # целиком берутся из индекса (accounts.views.account_transactions)
+            models.Index(fields=['from_account', '-created_at', '-id']),
+            models.Index(fields=['to_account', '-created_at', '-id']),
             models.Index(fields=['reference_number']),
             models.Index(fields=['created_at']),
             models.Index(fields=['status']),
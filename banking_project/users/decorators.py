@@ -1,12 +1,24 @@
 from django.http import HttpResponseForbidden
 from django.contrib.auth.decorators import user_passes_test
-from functools import wraps
+from functools import lru_cache, wraps
 from django.apps import apps
 
 
-def get_user_model():
-    """Ленивая загрузка модели User"""
-    return apps.get_model('users', 'User')
+@lru_cache(maxsize=None)
+def get_model(app_label, model_name):
+    """Модель из реестра приложений; поиск выполняется один раз на процесс"""
+    return apps.get_model(app_label, model_name)
+
+
+def get_user_role(request):
+    """
+    Роль текущего пользователя (None для анонимного).
+    Вычисляется один раз за запрос и запоминается на объекте request
+    """
+    if not hasattr(request, '_cached_user_role'):
+        user = request.user
+        request._cached_user_role = user.role if user.is_authenticated else None
+    return request._cached_user_role
 
 
 def role_required(allowed_roles):
@@ -14,12 +26,13 @@ def role_required(allowed_roles):
     Декоратор для проверки ролей пользователя
     Использование: @role_required(['admin', 'employee'])
     """
+    # Множество строится один раз при декорировании, а не на каждый запрос
+    allowed_roles = frozenset(allowed_roles)
 
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            User = get_user_model()
-            if request.user.is_authenticated and request.user.role in allowed_roles:
+            if get_user_role(request) in allowed_roles:
                 return view_func(request, *args, **kwargs)
             else:
                 return HttpResponseForbidden("У вас нет доступа к этой странице.")
@@ -38,9 +51,15 @@ def client_required(view_func):
 
 def employee_required(view_func):
     """
-    Декоратор для доступа только сотрудникам
+    Декоратор для доступа только сотрудникам (см. User.is_staff_role)
     """
-    return role_required(['employee', 'admin'])(view_func)
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated and request.user.is_staff_role:
+            return view_func(request, *args, **kwargs)
+        return HttpResponseForbidden("У вас нет доступа к этой странице.")
+
+    return wrapper
 
 
 def admin_required(view_func):
@@ -55,16 +74,16 @@ def check_client_ownership(model_name, id_parameter='pk'):
     Декоратор для проверки, что клиент имеет доступ только к своим данным
     """
 
+    app_label, model = model_name.split('.')
+
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            User = get_user_model()
-
-            if request.user.role != 'client':
+            if get_user_role(request) != 'client':
                 return view_func(request, *args, **kwargs)
 
-            # Ленивая загрузка модели
-            Model = apps.get_model(model_name.split('.')[0], model_name.split('.')[1])
+            # Ленивая загрузка модели (поиск в реестре выполняется один раз)
+            Model = get_model(app_label, model)
             obj_id = kwargs.get(id_parameter)
 
             try:
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class UserRole(models.TextChoices):
@@ -10,6 +11,10 @@ class UserRole(models.TextChoices):
     ADMIN = 'admin', 'Администратор'
 
 
+# Роли персонала банка (доступ ко всем клиентам и счетам)
+STAFF_ROLES = frozenset({UserRole.EMPLOYEE, UserRole.ADMIN})
+
+
 class Department(models.Model):
     name = models.CharField(
         max_length=100,
@@ -112,6 +117,11 @@ class User(AbstractUser):
             self.username = self.email
         super().save(*args, **kwargs)
 
+    @cached_property
+    def is_staff_role(self):
+        """Сотрудник или администратор банка (вычисляется один раз для экземпляра)"""
+        return self.role in STAFF_ROLES
+
     def is_locked(self):
         """Проверка, заблокирован ли пользователь"""
         if self.locked_until: